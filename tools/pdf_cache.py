@@ -0,0 +1,103 @@
+import atexit
+import hashlib
+import threading
+from collections import OrderedDict
+from collections.abc import Generator
+from contextlib import contextmanager
+from typing import Optional, Tuple
+
+import pymupdf
+
+# Maximum number of parsed source documents kept open between tool invocations
+CACHE_SIZE = 4
+# Larger files are neither hashed nor cached; they are parsed per invocation
+MAX_CACHED_BYTES = 100 * 1024 * 1024
+
+_cache: "OrderedDict[Tuple[Optional[str], bytes], pymupdf.Document]" = OrderedDict()
+_lock = threading.Lock()
+
+
+@contextmanager
+def open_pdf(
+    pdf_bytes: bytes, conversation_id: Optional[str] = None
+) -> Generator[pymupdf.Document, None, None]:
+    """
+    Open a PDF from bytes, reusing an already parsed document for the same content.
+
+    Workflows often run several tools on the same file (count the pages, then extract
+    some of them), so parsed documents are kept in a small LRU cache keyed by the
+    conversation and a BLAKE2b digest of the content. A cached document is checked out
+    while in use, so it is never shared between concurrent invocations, and goes back
+    into the cache on exit. Files over MAX_CACHED_BYTES bypass the cache and are closed
+    on exit. Callers must not close the yielded document.
+
+    Args:
+        pdf_bytes (bytes): Raw PDF file content
+        conversation_id (Optional[str], optional): Conversation the document is cached for. Defaults to None.
+
+    Returns:
+        Generator[pymupdf.Document, None, None]: Context manager yielding the opened document
+
+    Raises:
+        ValueError: If the content cannot be opened as a PDF
+    """
+    key = None
+    doc = None
+    if len(pdf_bytes) <= MAX_CACHED_BYTES:
+        key = (conversation_id, hashlib.blake2b(pdf_bytes, digest_size=16).digest())
+        with _lock:
+            doc = _cache.pop(key, None)
+
+    if doc is None:
+        try:
+            # MuPDF reads the bytes in place; no BytesIO wrapper is needed
+            doc = pymupdf.open(stream=pdf_bytes, filetype="pdf")
+        except Exception as e:
+            raise ValueError(f"Invalid PDF file: {str(e)}")
+
+    try:
+        yield doc
+    finally:
+        if key is None:
+            doc.close()
+        else:
+            _release(key, doc)
+        # Drop MuPDF's cached fonts and images so memory does not keep growing across
+        # invocations; the parsed documents themselves stay cached
+        pymupdf.TOOLS.store_shrink(100)
+
+
+def _release(key: Tuple[Optional[str], bytes], doc: pymupdf.Document) -> None:
+    """
+    Return a checked-out document to the cache, closing whatever no longer fits.
+    """
+    if doc.is_closed:
+        return
+
+    evicted = None
+    with _lock:
+        if key in _cache:
+            # Another invocation cached the same content in the meantime
+            evicted = doc
+        else:
+            _cache[key] = doc
+            if len(_cache) > CACHE_SIZE:
+                _, evicted = _cache.popitem(last=False)
+
+    if evicted is not None:
+        evicted.close()
+
+
+def clear_cache() -> None:
+    """
+    Close and drop all cached documents.
+    """
+    with _lock:
+        docs = list(_cache.values())
+        _cache.clear()
+
+    for doc in docs:
+        doc.close()
+
+
+atexit.register(clear_cache)
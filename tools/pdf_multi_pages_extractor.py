@@ -1,6 +1,7 @@
-import io
+import os
+import re
 from collections.abc import Generator
-from typing import Any, Optional, List
+from typing import Any, Optional, List, Tuple
 
 import pymupdf
 from dify_plugin.entities import I18nObject
@@ -8,6 +9,17 @@ from dify_plugin.entities.tool import ToolInvokeMessage, ToolParameter
 from dify_plugin import Tool
 from dify_plugin.file.file import File
 
+from tools.pdf_cache import open_pdf
+
+# A single page ("5") or a range ("1-3"); either end of a range may be omitted ("-3", "5-")
+_PAGE_TOKEN = r"\d+(?:\s*-(?:\s*\d+)?)?|-(?:\s*\d+)?"
+# A whole page specification: comma-separated tokens, empty entries allowed
+_PAGE_SPEC_RE = re.compile(
+    rf"\s*(?:(?:{_PAGE_TOKEN})\s*)?(?:,\s*(?:(?:{_PAGE_TOKEN})\s*)?)*"
+)
+# One token of an already validated specification: (token, start, dash, end)
+_PAGE_TOKEN_RE = re.compile(r"\s*((\d*)(?:\s*(-)(?:\s*(\d+))?)?)\s*(?:,|$)")
+
 
 class PDFMultiPagesExtractorTool(Tool):
     """
@@ -24,72 +36,120 @@ class PDFMultiPagesExtractorTool(Tool):
     """
 
     @staticmethod
-    def _parse_page_string(page_str: str, total_pages: int) -> List[int]:
+    def _parse_page_string(page_str: str) -> List[Tuple[int, Optional[int]]]:
         """
-        Parses a page string (e.g., "1-3,5,1-2") into a list of 0-based page indices,
-        preserving order and duplicates. Validates against total_pages.
+        Parses a page string (e.g., "1-3,5,1-2") into a list of 1-based, inclusive
+        (start, end) pairs, preserving order and duplicates. The end of an open range
+        ("5-") is None. Only the syntax is checked, so this runs before the PDF is opened.
         """
         if not page_str:
             return []
 
-        indices: List[int] = []
-        parts = page_str.replace(" ", "").split(",")
+        if not _PAGE_SPEC_RE.fullmatch(page_str):
+            raise ValueError(
+                f"Could not parse '{page_str}'. Use page numbers or 'start-end' ranges separated by commas."
+            )
+
+        pairs: List[Tuple[int, Optional[int]]] = []
 
-        for part in parts:
+        for match in _PAGE_TOKEN_RE.finditer(page_str):
+            part, start_str, dash, end_str = match.groups()
             if not part:
                 continue
-            if "-" in part:
-                range_parts = part.split("-", 1)
-                if len(range_parts) != 2:
-                    raise ValueError(
-                        f"Invalid range format: '{part}'. Use 'start-end'."
-                    )
-
-                start_str, end_str = range_parts
 
-                try:
-                    start = int(start_str) if start_str else 1
-                    end = int(end_str) if end_str else total_pages
-                except ValueError:
-                    raise ValueError(
-                        f"Invalid page number in range: '{part}'. Pages must be integers."
-                    )
-
-                if start < 1 or end < 1:
+            if dash:
+                start = int(start_str) if start_str else 1
+                end = int(end_str) if end_str else None
+                if start < 1 or end == 0:
                     raise ValueError(f"Page numbers must be positive: '{part}'.")
-                if start > end:
+                if end is not None and start > end:
                     raise ValueError(
                         f"Start page cannot be greater than end page in range: '{part}'."
                     )
-                if start > total_pages or end > total_pages:
-                    raise ValueError(
-                        f"Page number out of range in '{part}'. PDF has {total_pages} pages (1 to {total_pages})."
-                    )
-
-                indices.extend(range(start - 1, end))
             else:
-                try:
-                    page_num = int(part)
-                except ValueError:
-                    raise ValueError(
-                        f"Invalid page number: '{part}'. Pages must be integers."
-                    )
-
-                if page_num < 1:
+                start = end = int(start_str)
+                if start < 1:
                     raise ValueError(f"Page number must be positive: '{part}'.")
-                if page_num > total_pages:
-                    raise ValueError(
-                        f"Page number {page_num} out of range. PDF has {total_pages} pages (1 to {total_pages})."
-                    )
 
-                indices.append(page_num - 1)
+            pairs.append((start, end))
 
-        if not indices:
+        if not pairs:
             raise ValueError(
                 f"No valid page numbers found in specification: '{page_str}'."
             )
 
-        return indices
+        return pairs
+
+    @staticmethod
+    def _resolve_page_ranges(
+        pairs: List[Tuple[int, Optional[int]]], total_pages: int
+    ) -> List[Tuple[int, int]]:
+        """
+        Converts parsed (start, end) pairs into 0-based, half-open (start, stop) page
+        ranges, closing open ranges at the last page. Validates against total_pages.
+        """
+        ranges = [
+            (start - 1, total_pages if end is None else end) for start, end in pairs
+        ]
+
+        max_page = max((max(start + 1, stop) for start, stop in ranges), default=0)
+        if max_page > total_pages:
+            raise ValueError(
+                f"Page number {max_page} out of range. PDF has {total_pages} pages (1 to {total_pages})."
+            )
+
+        return ranges
+
+    @staticmethod
+    def _to_page_runs(ranges: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        """
+        Merges adjacent half-open page ranges into longer runs of consecutive pages,
+        preserving order and duplicates (e.g., [(0, 2), (2, 3), (0, 1)] -> [(0, 3), (0, 1)]).
+        """
+        runs: List[Tuple[int, int]] = []
+        for start, stop in ranges:
+            if runs and start == runs[-1][1]:
+                runs[-1] = (runs[-1][0], stop)
+            else:
+                runs.append((start, stop))
+        return runs
+
+    @staticmethod
+    def _insert_page_runs(
+        output: pymupdf.Document,
+        doc: pymupdf.Document,
+        page_runs: List[Tuple[int, int]],
+    ) -> None:
+        """
+        Appends the given runs of source pages to the output document. Consecutive pages
+        are copied as one run instead of one call per page, and runs already present in
+        the output are repeated as new page objects sharing the existing contents and
+        resources.
+        """
+        # Bound once rather than looked up on every iteration
+        insert_pdf = output.insert_pdf
+        # Unlike copy_page, gives each slot its own /Page object, so no page appears
+        # twice in the page tree
+        fullcopy_page = output.fullcopy_page
+
+        # (start, stop, output page number) of every run copied from the source
+        copied_runs: List[Tuple[int, int, int]] = []
+        for start, stop in page_runs:
+            earlier = next(
+                (
+                    (copied_start, first_page)
+                    for copied_start, copied_stop, first_page in copied_runs
+                    if copied_start <= start and stop <= copied_stop
+                ),
+                None,
+            )
+            if earlier:
+                copied_start, first_page = earlier
+                for index in range(start, stop):
+                    fullcopy_page(first_page + index - copied_start)
+            else:
+                copied_runs.append((start, stop, output.page_count))
+                insert_pdf(doc, from_page=start, to_page=stop - 1)
 
     def _invoke(
         self,
@@ -99,8 +159,6 @@ class PDFMultiPagesExtractorTool(Tool):
         app_id: Optional[str] = None,
         message_id: Optional[str] = None,
     ) -> Generator[ToolInvokeMessage, None, None]:
-        doc = None
-        output = None
         try:
             # Get and validate PDF content
             pdf_content = tool_parameters.get("pdf_content")
@@ -121,57 +179,63 @@ class PDFMultiPagesExtractorTool(Tool):
                     "Invalid optional parameter: fixed_pages (must be a string)"
                 )
 
-            # Get the PDF content directly from the File object
-            pdf_bytes = pdf_content.blob
-            original_filename = pdf_content.filename or "document"
-            pdf_file = io.BytesIO(pdf_bytes)
-
+            # Check the page strings before downloading and parsing the PDF
             try:
-                doc = pymupdf.open(stream=pdf_file, filetype="pdf")
-            except Exception as e:
-                raise ValueError(f"Invalid or corrupted PDF file: {str(e)}")
-
-            total_pages = doc.page_count
-            if total_pages == 0:
-                raise ValueError("The provided PDF file has no pages.")
-
-            # Parse page strings into 0-based indices
-            try:
-                fixed_page_indices = self._parse_page_string(
-                    fixed_pages_str, total_pages
-                )
-                dynamic_page_indices = self._parse_page_string(
-                    dynamic_pages_str, total_pages
-                )
+                fixed_page_pairs = self._parse_page_string(fixed_pages_str)
+                dynamic_page_pairs = self._parse_page_string(dynamic_pages_str)
             except ValueError as e:
                 # Re-raise parsing errors with context
                 raise ValueError(f"Invalid page specification: {e}")
 
-            use_fixed = bool(fixed_page_indices)
+            # Get the PDF content directly from the File object
+            pdf_bytes = pdf_content.blob
+            original_filename = pdf_content.filename or "document"
 
-            # Create the output PDF
-            output = pymupdf.Document()
+            with open_pdf(pdf_bytes, self.session.conversation_id) as doc:
+                total_pages = doc.page_count
+                if total_pages == 0:
+                    raise ValueError("The provided PDF file has no pages.")
 
-            # Add fixed pages first, preserving order and duplicates
-            if use_fixed:
-                for index in fixed_page_indices:
-                    output.insert_pdf(doc, from_page=index, to_page=index)
+                # Resolve the parsed pages into 0-based page ranges
+                try:
+                    fixed_page_ranges = self._resolve_page_ranges(
+                        fixed_page_pairs, total_pages
+                    )
+                    dynamic_page_ranges = self._resolve_page_ranges(
+                        dynamic_page_pairs, total_pages
+                    )
+                except ValueError as e:
+                    # Re-raise range errors with context
+                    raise ValueError(f"Invalid page specification: {e}")
 
-            # Add dynamic pages, preserving order and duplicates
-            for index in dynamic_page_indices:
-                output.insert_pdf(doc, from_page=index, to_page=index)
+                use_fixed = bool(fixed_page_ranges)
 
-            if output.page_count == 0:
-                raise ValueError("The specified page numbers resulted in an empty PDF.")
+                page_runs = self._to_page_runs(
+                    [*fixed_page_ranges, *dynamic_page_ranges]
+                )
 
-            page_buffer = io.BytesIO()
-            output.save(page_buffer)
-            page_buffer.seek(0)
+                if page_runs == [(0, total_pages)]:
+                    # Every page exactly once and in order: the source file is the result
+                    output_bytes = pdf_bytes
+                else:
+                    # Create the output PDF
+                    with pymupdf.Document() as output:
+                        # Add fixed pages first, then dynamic pages, preserving order and duplicates
+                        self._insert_page_runs(output, doc, page_runs)
+
+                        if output.page_count == 0:
+                            raise ValueError(
+                                "The specified page numbers resulted in an empty PDF."
+                            )
+
+                        # garbage=3 would also merge duplicates, but gets slow on large outputs
+                        output_bytes = output.tobytes(
+                            garbage=1, deflate=True, use_objstms=True
+                        )
 
             # Generate descriptive filename
-            if original_filename.lower().endswith(".pdf"):
-                base_filename = original_filename[:-4]
-            else:
+            base_filename, extension = os.path.splitext(original_filename)
+            if extension.lower() != ".pdf":
                 base_filename = original_filename
 
             dynamic_desc = dynamic_pages_str.replace(",", "_").replace("-", "to")
@@ -190,29 +254,15 @@ class PDFMultiPagesExtractorTool(Tool):
             yield self.create_text_message(success_message)
 
             yield self.create_blob_message(
-                blob=page_buffer.getvalue(),
+                blob=output_bytes,
                 meta={"mime_type": "application/pdf", "file_name": output_filename},
             )
 
-            # Clean up
-            if output:
-                output.close()
-            if doc:
-                doc.close()
-
         except ValueError as e:
             # Catch specific ValueErrors (parsing, validation) and raise them
-            if output:
-                output.close()
-            if doc:
-                doc.close()
             raise e
         except Exception as e:
             # Catch general exceptions
-            if output:
-                output.close()
-            if doc:
-                doc.close()
             raise Exception(
                 f"An unexpected error occurred during PDF processing: {str(e)}"
             )
@@ -1,6 +1,3 @@
-import io
-import pymupdf
-from collections import OrderedDict
 from dify_plugin.entities import I18nObject
 from dify_plugin.entities.tool import ToolInvokeMessage, ToolParameter
 from dify_plugin import Tool
@@ -8,6 +5,11 @@ from dify_plugin.file.file import File
 from collections.abc import Generator
 from typing import Any, Optional
 
+from tools.pdf_cache import open_pdf
+
+# Above this many pages the per-page JSON mapping is only built when asked for
+_PAGE_MAP_LIMIT = 1000
+
 
 class PDFPageCounterTool(Tool):
     """
@@ -30,6 +32,7 @@ class PDFPageCounterTool(Tool):
         Args:
             tool_parameters (dict[str, Any]): Parameters for the tool
                 - pdf_content (File): Dify File object containing the PDF
+                - verbose (bool, optional): Always output the per-page mapping. Defaults to False.
             user_id (Optional[str], optional): The ID of the user invoking the tool. Defaults to None.
             conversation_id (Optional[str], optional): The conversation ID. Defaults to None.
             app_id (Optional[str], optional): The app ID. Defaults to None.
@@ -42,44 +45,36 @@ class PDFPageCounterTool(Tool):
             ValueError: If the PDF content format is invalid or required parameters are missing
             Exception: For any other errors during PDF processing
         """
-        doc = None
         try:
             pdf_content = tool_parameters.get("pdf_content")
 
             if not isinstance(pdf_content, File):
                 raise ValueError("Invalid PDF content format. Expected File object.")
 
-            try:
-                # Wrap the bytes in BytesIO to provide seek capability
-                pdf_file = io.BytesIO(pdf_content.blob)
-                doc = pymupdf.open(stream=pdf_file, filetype="pdf")
-            except Exception as e:
-                raise ValueError(f"Invalid PDF file: {str(e)}")
-
-            total_pages = doc.page_count
+            with open_pdf(pdf_content.blob, self.session.conversation_id) as doc:
+                total_pages = doc.page_count
 
             # Output text format
             yield self.create_text_message(str(total_pages))
 
+            # Large documents only get the total unless the full mapping is requested
+            if total_pages > _PAGE_MAP_LIMIT and not tool_parameters.get(
+                "verbose", False
+            ):
+                yield self.create_json_message({"total_pages": total_pages})
+                return
+
             # Output JSON format with page numbers
-            page_dict = OrderedDict()
-            # Dynamic padding based on total pages (e.g., 3 digits for 100-999 pages)
-            padding = len(str(total_pages))
-            for i in range(total_pages):
-                page_dict[f"page{i + 1:0{padding}d}"] = i + 1
+            # Dynamic padding based on total pages (e.g., 3 digits for 100-999 pages).
+            # The key template is built once instead of re-parsing a nested format
+            # spec for every page.
+            page_key = f"page{{:0{len(str(total_pages))}d}}".format
+            page_dict = {page_key(i): i for i in range(1, total_pages + 1)}
             yield self.create_json_message(page_dict)
 
-            # Clean up
-            if doc:
-                doc.close()
-
         except ValueError:
-            if doc:
-                doc.close()
             raise
         except Exception as e:
-            if doc:
-                doc.close()
             raise Exception(f"Error counting pages in PDF: {str(e)}")
 
     def get_runtime_parameters(
@@ -107,5 +102,17 @@ class PDFPageCounterTool(Tool):
                 required=True,
                 file_accepts=["application/pdf"],
             ),
+            ToolParameter(
+                name="verbose",
+                label=I18nObject(en_US="Verbose", zh_Hans="详细输出"),
+                human_description=I18nObject(
+                    en_US="Output the per-page mapping even for PDFs with more than 1000 pages",
+                    zh_Hans="即使 PDF 超过 1000 页也输出逐页映射",
+                ),
+                type=ToolParameter.ToolParameterType.BOOLEAN,
+                form=ToolParameter.ToolParameterForm.FORM,
+                required=False,
+                default=False,
+            ),
         ]
         return parameters
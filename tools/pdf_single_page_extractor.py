@@ -1,4 +1,4 @@
-import io
+import os
 from collections.abc import Generator
 from typing import Any, Optional
 
@@ -8,6 +8,8 @@ from dify_plugin.entities.tool import ToolInvokeMessage, ToolParameter
 from dify_plugin import Tool
 from dify_plugin.file.file import File
 
+from tools.pdf_cache import open_pdf
+
 
 class PDFSinglePageExtractorTool(Tool):
     """
@@ -43,8 +45,6 @@ class PDFSinglePageExtractorTool(Tool):
             ValueError: If the PDF content format is invalid, required parameters are missing, or the page number is out of range
             Exception: For any other errors during PDF processing
         """
-        doc = None
-        output = None
         try:
             # Get and validate input parameters
             pdf_content = tool_parameters.get("pdf_content")
@@ -71,29 +71,23 @@ class PDFSinglePageExtractorTool(Tool):
             pdf_bytes = pdf_content.blob
             original_filename = pdf_content.filename or "document"
 
-            pdf_file = io.BytesIO(pdf_bytes)
-
-            try:
-                doc = pymupdf.open(stream=pdf_file, filetype="pdf")
-            except Exception as e:
-                raise ValueError(f"Invalid PDF file: {str(e)}")
-
-            total_pages = doc.page_count
-            if page_number < 0 or page_number >= total_pages:
-                raise ValueError(
-                    f"Invalid page number. The PDF has {total_pages} pages (1-{total_pages}). You entered: {user_page_number}."
-                )
+            with open_pdf(pdf_bytes, self.session.conversation_id) as doc:
+                total_pages = doc.page_count
+                if page_number < 0 or page_number >= total_pages:
+                    raise ValueError(
+                        f"Invalid page number. The PDF has {total_pages} pages (1-{total_pages}). You entered: {user_page_number}."
+                    )
 
-            output = pymupdf.Document()
-            output.insert_pdf(doc, from_page=page_number, to_page=page_number)
+                with pymupdf.Document() as output:
+                    output.insert_pdf(doc, from_page=page_number, to_page=page_number)
 
-            page_buffer = io.BytesIO()
-            output.save(page_buffer)
-            page_buffer.seek(0)
+                    # Drop unused and duplicate objects and compress the result
+                    output_bytes = output.tobytes(
+                        garbage=3, deflate=True, use_objstms=True
+                    )
 
-            if original_filename.lower().endswith(".pdf"):
-                base_filename = original_filename[:-4]
-            else:
+            base_filename, extension = os.path.splitext(original_filename)
+            if extension.lower() != ".pdf":
                 base_filename = original_filename
 
             output_filename = f"{base_filename}_page{user_page_number}.pdf"
@@ -103,27 +97,13 @@ class PDFSinglePageExtractorTool(Tool):
             )
 
             yield self.create_blob_message(
-                blob=page_buffer.getvalue(),
+                blob=output_bytes,
                 meta={"mime_type": "application/pdf", "file_name": output_filename},
             )
 
-            # Clean up
-            if output:
-                output.close()
-            if doc:
-                doc.close()
-
         except ValueError:
-            if output:
-                output.close()
-            if doc:
-                doc.close()
             raise
         except Exception as e:
-            if output:
-                output.close()
-            if doc:
-                doc.close()
             raise Exception(f"Error extracting page from PDF: {str(e)}")
 
     def get_runtime_parameters(
@@ -1,4 +1,6 @@
 import io
+import os
+import zipfile
 from collections.abc import Generator
 from typing import Any, Optional
 
@@ -8,6 +10,8 @@ from dify_plugin.entities.tool import ToolInvokeMessage, ToolParameter
 from dify_plugin import Tool
 from dify_plugin.file.file import File
 
+from tools.pdf_cache import open_pdf
+
 
 class PDFSplitterTool(Tool):
     """
@@ -30,6 +34,8 @@ class PDFSplitterTool(Tool):
         Args:
             tool_parameters (dict[str, Any]): Parameters for the tool
                 - pdf_content (File): Dify File object containing the PDF
+                - compress (bool, optional): Compress and garbage-collect each page file. Defaults to True.
+                - as_zip (bool, optional): Return all pages in a single ZIP archive. Defaults to False.
             user_id (Optional[str], optional): The ID of the user invoking the tool. Defaults to None.
             conversation_id (Optional[str], optional): The conversation ID. Defaults to None.
             app_id (Optional[str], optional): The app ID. Defaults to None.
@@ -42,84 +48,81 @@ class PDFSplitterTool(Tool):
             ValueError: If the PDF content format is invalid or required parameters are missing
             Exception: For any other errors during PDF processing
         """
-        doc = None
         try:
             pdf_content = tool_parameters.get("pdf_content")
             if not isinstance(pdf_content, File):
                 raise ValueError("Invalid PDF content format. Expected File object.")
 
             original_filename = pdf_content.filename or "document"
+            compress = tool_parameters.get("compress", True)
+            as_zip = tool_parameters.get("as_zip", False)
 
-            try:
-                # Convert bytes to BytesIO object before passing to pymupdf
-                pdf_bytes_io = io.BytesIO(pdf_content.blob)
-                doc = pymupdf.open(stream=pdf_bytes_io, filetype="pdf")
-            except Exception as e:
-                raise ValueError(f"Invalid PDF file: {str(e)}")
+            # Prepare the base filename once for every page
+            base_filename, extension = os.path.splitext(original_filename)
+            if extension.lower() != ".pdf":
+                base_filename = original_filename
 
-            total_pages = doc.page_count
+            # Compressing drops unused or duplicate objects and deflates uncompressed
+            # streams; skipping it writes the copied streams out as they are, which is
+            # faster but gives larger files
+            if compress:
+                save_options = {"garbage": 3, "deflate": True, "use_objstms": True}
+            else:
+                save_options = {"garbage": 0, "deflate": False}
 
-            if total_pages == 0:
-                raise ValueError("The PDF file contains no pages.")
+            with open_pdf(pdf_content.blob, self.session.conversation_id) as doc:
+                total_pages = doc.page_count
 
-            # Prepare the base filename
-            if original_filename.lower().endswith(".pdf"):
-                base_filename = original_filename[:-4]
-            else:
-                base_filename = original_filename
+                if total_pages == 0:
+                    raise ValueError("The PDF file contains no pages.")
 
-            # Process each page
-            page_files = []
-            for page_idx in range(total_pages):
-                # Create a new PDF with just this page
-                output = pymupdf.Document()
-                output.insert_pdf(doc, from_page=page_idx, to_page=page_idx)
-
-                # Write to a buffer
-                page_buffer = io.BytesIO()
-                output.save(page_buffer)
-                page_buffer.seek(0)
-
-                # Create filename for this page
-                output_filename = f"{base_filename}_page{page_idx + 1}.pdf"
-
-                # Add to our list of files
-                page_files.append(
-                    {
-                        "blob": page_buffer.getvalue(),
-                        "meta": {
+                # Send a summary message
+                yield self.create_text_message(
+                    f"Successfully split PDF into {total_pages} pages."
+                )
+
+                # PDF pages are already compressed, so the archive only stores them
+                zip_buffer = zip_file = None
+                if as_zip:
+                    zip_buffer = io.BytesIO()
+                    zip_file = zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_STORED)
+
+                # Unless zipping, send each page as soon as it is produced, so only one
+                # page is held in memory at a time instead of every split file
+                for page_idx in range(total_pages):
+                    # Create a new PDF with just this page
+                    with pymupdf.Document() as output:
+                        output.insert_pdf(doc, from_page=page_idx, to_page=page_idx)
+                        page_bytes = output.tobytes(**save_options)
+
+                    # Create filename for this page
+                    output_filename = f"{base_filename}_page{page_idx + 1}.pdf"
+
+                    if zip_file:
+                        zip_file.writestr(output_filename, page_bytes)
+                        continue
+
+                    yield self.create_blob_message(
+                        blob=page_bytes,
+                        meta={
                             "mime_type": "application/pdf",
                             "file_name": output_filename,
                         },
-                    }
-                )
-
-                # Clean up output document for this page
-                output.close()
-
-            # Clean up source document
-            if doc:
-                doc.close()
-
-            # Send a summary message
-            yield self.create_text_message(
-                f"Successfully split PDF into {total_pages} pages."
-            )
+                    )
 
-            # Send each page as a separate blob message
-            for page_file in page_files:
+            if zip_file:
+                zip_file.close()
                 yield self.create_blob_message(
-                    blob=page_file["blob"],
-                    meta=page_file["meta"],
+                    blob=zip_buffer.getvalue(),
+                    meta={
+                        "mime_type": "application/zip",
+                        "file_name": f"{base_filename}_pages.zip",
+                    },
                 )
 
         except ValueError:
-            if doc:
-                doc.close()
             raise
         except Exception as e:
-            if doc:
-                doc.close()
             raise Exception(f"Error splitting PDF into pages: {str(e)}")
 
     def get_runtime_parameters(
@@ -147,5 +150,29 @@ class PDFSplitterTool(Tool):
                 required=True,
                 file_accepts=["application/pdf"],
             ),
+            ToolParameter(
+                name="compress",
+                label=I18nObject(en_US="Compress", zh_Hans="压缩"),
+                human_description=I18nObject(
+                    en_US="Compress each page file (smaller files); turn off for faster splitting",
+                    zh_Hans="压缩每个页面文件（文件更小）；关闭可加快分割速度",
+                ),
+                type=ToolParameter.ToolParameterType.BOOLEAN,
+                form=ToolParameter.ToolParameterForm.FORM,
+                required=False,
+                default=True,
+            ),
+            ToolParameter(
+                name="as_zip",
+                label=I18nObject(en_US="As ZIP", zh_Hans="打包为 ZIP"),
+                human_description=I18nObject(
+                    en_US="Return all pages in a single ZIP archive instead of separate files",
+                    zh_Hans="将所有页面打包为一个 ZIP 文件返回，而不是单独的文件",
+                ),
+                type=ToolParameter.ToolParameterType.BOOLEAN,
+                form=ToolParameter.ToolParameterForm.FORM,
+                required=False,
+                default=False,
+            ),
         ]
         return parameters
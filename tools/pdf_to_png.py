@@ -1,14 +1,54 @@
-import io
-from collections.abc import Generator
+import multiprocessing
+import os
+import threading
+from collections.abc import Generator, Iterator
+from multiprocessing.connection import Connection
 from typing import Any, Optional
 
 import pymupdf
-from PIL import Image
 from dify_plugin.entities import I18nObject
-from dify_plugin.entities.tool import ToolInvokeMessage, ToolParameter
+from dify_plugin.entities.tool import (
+    ToolInvokeMessage,
+    ToolParameter,
+    ToolParameterOption,
+)
 from dify_plugin import Tool
 from dify_plugin.file.file import File
 
+from tools.pdf_cache import open_pdf
+
+# Rendering is CPU-bound and PyMuPDF holds the GIL, so larger documents can be rendered
+# in forked worker processes. Off by default; set PDF_TO_PNG_MAX_WORKERS to opt in.
+_MAX_WORKERS = min(
+    int(os.environ.get("PDF_TO_PNG_MAX_WORKERS", "1")), os.cpu_count() or 1
+)
+# Below this many pages, starting worker processes costs more than it saves
+_PARALLEL_MIN_PAGES = 8
+# Held while worker processes from this module are running
+_workers_lock = threading.Lock()
+
+# Supported output formats and their MIME types, all encoded natively by MuPDF
+_IMAGE_FORMATS = {"png": "image/png", "jpg": "image/jpeg"}
+# JPEG quality; ignored for PNG
+_JPEG_QUALITY = 85
+
+# Set in the parent just before the workers fork, so they inherit the parsed document
+_worker_doc: Optional[pymupdf.Document] = None
+_worker_matrix: Optional[pymupdf.Matrix] = None
+
+
+def _render_worker(
+    conn: Connection, first_page: int, step: int, image_format: str
+) -> None:
+    """
+    Render every step-th page of the inherited document from first_page on, sending
+    each image down the pipe in order.
+    """
+    for page_num in range(first_page, _worker_doc.page_count, step):
+        pix = _worker_doc.load_page(page_num).get_pixmap(matrix=_worker_matrix)
+        conn.send_bytes(pix.tobytes(image_format, jpg_quality=_JPEG_QUALITY))
+    conn.close()
+
 
 class PDFToPNGTool(Tool):
     """
@@ -31,6 +71,7 @@ class PDFToPNGTool(Tool):
             tool_parameters (dict[str, Any]): Parameters for the tool
                 - pdf_content (File): Dify File object containing the PDF
                 - zoom (float): Zoom factor for image quality (default is 2)
+                - format (str): Output image format, "png" or "jpg" (default is "png")
             user_id (Optional[str]): The ID of the user invoking the tool
             conversation_id (Optional[str]): The conversation ID
             app_id (Optional[str]): The app ID
@@ -43,7 +84,6 @@ class PDFToPNGTool(Tool):
             ValueError: If the PDF content format is invalid or required parameters are missing
             Exception: For any other errors during PDF processing
         """
-        doc = None
         try:
             # Get and validate parameters
             pdf_content = tool_parameters.get("pdf_content")
@@ -54,65 +94,140 @@ class PDFToPNGTool(Tool):
             zoom_param = tool_parameters.get("zoom")
             zoom = 2 if zoom_param is None else int(zoom_param)
 
+            # Get output format; JPEG has no alpha channel, which pages are rendered
+            # without anyway
+            image_format = str(tool_parameters.get("format") or "png").lower()
+            if image_format not in _IMAGE_FORMATS:
+                raise ValueError(
+                    f"Unsupported image format: {image_format}. Use 'png' or 'jpg'."
+                )
+
             original_filename = pdf_content.filename or "document"
-            base_filename = original_filename.rsplit(".", 1)[0]
+            base_filename = os.path.splitext(original_filename)[0] or original_filename
 
-            # Convert bytes to BytesIO object
-            pdf_bytes_io = io.BytesIO(pdf_content.blob)
+            pdf_bytes = pdf_content.blob
+            with open_pdf(pdf_bytes, self.session.conversation_id) as doc:
+                total_pages = doc.page_count
+                if total_pages == 0:
+                    raise ValueError("The PDF file contains no pages.")
 
-            try:
-                # Open PDF with PyMuPDF
-                doc = pymupdf.open(stream=pdf_bytes_io, filetype="pdf")
-            except Exception as e:
-                raise ValueError(f"Invalid PDF file: {str(e)}")
+                # Process each page
+                for page_num, image_bytes in enumerate(
+                    self._render_pages(doc, zoom, image_format)
+                ):
+                    # Create filename for this page
+                    output_filename = (
+                        f"{base_filename}_page{page_num + 1}.{image_format}"
+                    )
 
-            total_pages = doc.page_count
-            if total_pages == 0:
-                raise ValueError("The PDF file contains no pages.")
+                    # Send the image
+                    yield self.create_blob_message(
+                        blob=image_bytes,
+                        meta={
+                            "mime_type": _IMAGE_FORMATS[image_format],
+                            "file_name": output_filename,
+                        },
+                    )
 
-            # Process each page
-            for page_num in range(total_pages):
-                page = doc.load_page(page_num)
-                mat = pymupdf.Matrix(zoom, zoom)
-                pix = page.get_pixmap(matrix=mat)
+            # Send completion message
+            yield self.create_text_message(
+                f"Successfully converted {total_pages} pages to {image_format.upper()} images."
+            )
 
-                # Convert PyMuPDF pixmap to PIL Image
-                img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+        except ValueError:
+            raise
+        except Exception as e:
+            raise Exception(f"Error converting PDF to PNG: {str(e)}")
 
-                # Release pixmap memory
-                pix = None
+    @staticmethod
+    def _render_pages(
+        doc: pymupdf.Document, zoom: int, image_format: str
+    ) -> Iterator[bytes]:
+        """
+        Render every page of the document to image bytes, in page order.
 
-                # Save PIL Image to an in-memory bytes buffer
-                img_buffer = io.BytesIO()
-                img.save(img_buffer, format="PNG")
-                img_buffer.seek(0)
+        When PDF_TO_PNG_MAX_WORKERS allows it, documents with at least
+        _PARALLEL_MIN_PAGES pages are rendered by forked worker processes that inherit
+        the parsed document and take pages in turn. Rendering stays in this process when
+        another invocation is using workers or they cannot be started, and finishes
+        here if a worker dies.
+        """
+        global _worker_doc, _worker_matrix
 
-                # Create filename for this page
-                output_filename = f"{base_filename}_page{page_num + 1}.png"
+        total_pages = doc.page_count
+        # Only one set of workers from this module exists at a time
+        if (
+            _MAX_WORKERS < 2
+            or total_pages < _PARALLEL_MIN_PAGES
+            or "fork" not in multiprocessing.get_all_start_methods()
+            or not _workers_lock.acquire(blocking=False)
+        ):
+            yield from PDFToPNGTool._render_pages_serial(doc, zoom, image_format)
+            return
 
-                # Send the PNG image
-                yield self.create_blob_message(
-                    blob=img_buffer.getvalue(),
-                    meta={"mime_type": "image/png", "file_name": output_filename},
+        # Plain processes and pipes rather than ProcessPoolExecutor: its manager thread
+        # busy-waits on a dead worker, which hangs a gevent-patched process
+        ctx = multiprocessing.get_context("fork")
+        workers = []
+        next_page = 0
+        try:
+            _worker_doc = doc
+            _worker_matrix = pymupdf.Matrix(zoom, zoom)
+            for worker_idx in range(_MAX_WORKERS):
+                recv_conn, send_conn = ctx.Pipe(duplex=False)
+                process = ctx.Process(
+                    target=_render_worker,
+                    args=(send_conn, worker_idx, _MAX_WORKERS, image_format),
+                    daemon=True,
                 )
+                workers.append((process, recv_conn))
+                process.start()
+                send_conn.close()
 
-            # Send completion message
-            yield self.create_text_message(
-                f"Successfully converted {total_pages} pages to PNG images."
+            # Page n comes from worker n % workers; a worker blocks once its pipe is
+            # full, so finished images never pile up in memory
+            for page_num in range(total_pages):
+                yield workers[page_num % _MAX_WORKERS][1].recv_bytes()
+                next_page += 1
+        except (OSError, EOFError):
+            # Workers could not start, or one died (e.g. out of memory); the remaining
+            # pages are rendered below
+            pass
+        finally:
+            for process, recv_conn in workers:
+                if process.pid is not None:
+                    process.terminate()
+                    process.join()
+                recv_conn.close()
+            _worker_doc = _worker_matrix = None
+            _workers_lock.release()
+
+        if next_page < total_pages:
+            yield from PDFToPNGTool._render_pages_serial(
+                doc, zoom, image_format, next_page
             )
 
-            # Clean up
-            if doc:
-                doc.close()
+    @staticmethod
+    def _render_pages_serial(
+        doc: pymupdf.Document, zoom: int, image_format: str, first_page: int = 0
+    ) -> Iterator[bytes]:
+        """
+        Render the pages of the document from first_page on to image bytes in this
+        process, in page order.
+        """
+        # The same zoom applies to every page
+        mat = pymupdf.Matrix(zoom, zoom)
+        load_page = doc.load_page
+        for page_num in range(first_page, doc.page_count):
+            pix = load_page(page_num).get_pixmap(matrix=mat)
 
-        except ValueError:
-            if doc:
-                doc.close()
-            raise
-        except Exception as e:
-            if doc:
-                doc.close()
-            raise Exception(f"Error converting PDF to PNG: {str(e)}")
+            # Encode with MuPDF's native image encoder
+            image_bytes = pix.tobytes(image_format, jpg_quality=_JPEG_QUALITY)
+
+            # Release pixmap memory
+            pix = None
+
+            yield image_bytes
 
     def get_runtime_parameters(
         self,
@@ -151,5 +266,25 @@ class PDFToPNGTool(Tool):
                 required=False,
                 default=2,
             ),
+            ToolParameter(
+                name="format",
+                label=I18nObject(en_US="Image Format", zh_Hans="图片格式"),
+                human_description=I18nObject(
+                    en_US="Output image format: PNG (lossless) or JPG (lossy, smaller for scans and photos)",
+                    zh_Hans="输出图片格式：PNG（无损）或 JPG（有损，扫描件和照片体积更小）",
+                ),
+                type=ToolParameter.ToolParameterType.SELECT,
+                form=ToolParameter.ToolParameterForm.FORM,
+                required=False,
+                default="png",
+                options=[
+                    ToolParameterOption(
+                        value="png", label=I18nObject(en_US="PNG", zh_Hans="PNG")
+                    ),
+                    ToolParameterOption(
+                        value="jpg", label=I18nObject(en_US="JPG", zh_Hans="JPG")
+                    ),
+                ],
+            ),
         ]
         return parameters